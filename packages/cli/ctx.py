@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 import os
 import argparse
-import subprocess
-import time
 from pathlib import Path
-from datetime import datetime
+
+# Heavier modules (subprocess, concurrent.futures, datetime, ...) are imported
+# inside the commands that need them to keep CLI startup fast.
 
 # --- Configuration ---
 AI_DIR = Path(".ai")
@@ -13,6 +13,15 @@ MEMORY_DIR = Path(".agent_memory")
 OBSERVATIONS_DIR = MEMORY_DIR / "observations"
 CACHE_DIR = MEMORY_DIR / "context_cache"
 
+# Chunk size for streaming captured output (64KB)
+COPY_BUFSIZE = 1 << 16
+
+# Wrap preview lines longer than this are truncated
+PREVIEW_WIDTH = 200
+
+# Directories listed in the tree but never descended into
+SKIP_DIRS = frozenset({"node_modules", "venv", "__pycache__", "dist", "build", ".git"})
+
 # --- Templates ---
 
 CODING_STANDARDS_TEMPLATE = """# Coding Standards
@@ -56,38 +65,147 @@ Updated: {timestamp}
 {structure}
 """
 
+# Static templates pre-encoded for the init path
+CODING_STANDARDS_BYTES = CODING_STANDARDS_TEMPLATE.encode("utf-8")
+GOALS_BYTES = GOALS_TEMPLATE.encode("utf-8")
+GITIGNORE_BYTES = b"*\n!.gitignore\n!goals.md\n"
+
+# --- Helpers ---
+
+def _scan(path):
+    """
+    List a directory once via scandir as (is_dir, name, path, is_link) tuples,
+    skipping hidden entries. Directories sort first, then files; symlinks to
+    directories count as directories.
+    """
+    # Deliberately not os.fwalk: it adds an lstat+fstat per subdirectory. For a
+    # shallow tree, one scandir per directory is cheaper.
+    entries = []
+    with os.scandir(path) as it:
+        for e in it:
+            if e.name.startswith('.'):
+                continue
+            try:
+                is_dir = e.is_dir()
+            except OSError:
+                is_dir = False
+            entries.append((is_dir, e.name, e.path, e.is_symlink()))
+    entries.sort(key=lambda t: (not t[0], t[1]))
+    return entries
+
+def _create_file(path, content):
+    """
+    Write the bytes `content` to `path` only if it does not exist yet. O_EXCL
+    fuses the existence check and the create into a single open().
+    Returns True if the file was created.
+    """
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    return True
+
+def _make_context_dirs():
+    """
+    Create the leaf context directories. In an existing workspace each leaf
+    costs a single mkdir failing with EEXIST; a parent is only created when
+    its leaf's mkdir reports it missing.
+    """
+    for d in (SKILLS_DIR, OBSERVATIONS_DIR, CACHE_DIR):
+        try:
+            os.mkdir(d)
+        except FileExistsError:
+            pass
+        except FileNotFoundError:
+            d.parent.mkdir(exist_ok=True)
+            d.mkdir(exist_ok=True)
+
+def _get_tree(dir_path=".", max_depth=2):
+    """Generate a simplified directory tree string."""
+    if max_depth <= 0:
+        return ""
+    scan = _scan
+    skip_dirs = SKIP_DIRS
+    try:
+        entries = scan(dir_path)
+    except PermissionError:
+        return ""
+
+    parts = []
+    extend = parts.extend
+    # One frame per directory being listed: (prefix, depth, last index, entries).
+    # Descending pauses the parent's iterator, so line pieces are emitted in
+    # display order straight into `parts` without building per-line strings.
+    stack = [("", 0, len(entries) - 1, enumerate(entries))]
+    while stack:
+        prefix, depth, last, it = stack[-1]
+        for i, (is_dir, name, full_path, is_link) in it:
+            connector = "└── " if i == last else "├── "
+            if not is_dir:
+                extend((prefix, connector, name, "\n"))
+            elif name in skip_dirs:
+                extend((prefix, connector, name, "/ ...\n"))
+            else:
+                extend((prefix, connector, name, "/\n"))
+                # Only list subdirectories within max_depth; symlinked ones are
+                # shown but never descended into, which rules out link cycles
+                if depth + 1 < max_depth and not is_link:
+                    try:
+                        children = scan(full_path)
+                    except PermissionError:
+                        continue
+                    extension = "    " if i == last else "│   "
+                    stack.append((prefix + extension, depth + 1, len(children) - 1, enumerate(children)))
+                    break
+        else:
+            stack.pop()
+
+    # Drop the trailing newline of the last line
+    return "".join(parts)[:-1]
+
+def _git(*args):
+    """Run a read-only git command without taking optional index locks."""
+    import subprocess
+
+    env = dict(os.environ, GIT_OPTIONAL_LOCKS="0")
+    result = subprocess.run(["git", *args], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env, check=True)
+    return result.stdout.decode("utf-8", "replace")
+
 # --- Commands ---
 
 def cmd_init(args):
     """Initialize the Context Engineering directory structure."""
     print("🚀 Initializing Context Engineering structure...")
     
+    _make_context_dirs()
     dirs = [SKILLS_DIR, OBSERVATIONS_DIR, CACHE_DIR]
     for d in dirs:
-        d.mkdir(parents=True, exist_ok=True)
         print(f"✅ Created directory: {d}")
         
     # Create templates
     skills_file = SKILLS_DIR / "coding-standards.md"
-    if not skills_file.exists():
-        skills_file.write_text(CODING_STANDARDS_TEMPLATE)
+    if _create_file(skills_file, CODING_STANDARDS_BYTES):
         print(f"✅ Created skill: {skills_file}")
         
     goals_file = MEMORY_DIR / "goals.md"
-    if not goals_file.exists():
-        goals_file.write_text(GOALS_TEMPLATE)
+    if _create_file(goals_file, GOALS_BYTES):
         print(f"✅ Created memory: {goals_file}")
         
     # Create .gitignore for memory
     gitignore = MEMORY_DIR / ".gitignore"
-    if not gitignore.exists():
-        gitignore.write_text("*\n!.gitignore\n!goals.md\n")
+    if _create_file(gitignore, GITIGNORE_BYTES):
         print(f"✅ Created .gitignore for memory (ignoring transient files)")
 
     print("\n✨ Initialization complete! You are ready to engineer context.")
 
 def cmd_state(args):
     """Generate a snapshot of the current workspace state."""
+    import subprocess
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import datetime
+
     print("📸 Taking workspace snapshot...")
     
     # 1. Read goals
@@ -96,53 +214,27 @@ def cmd_state(args):
     
     # 2. Get file structure (simplified tree)
     # Python-native tree implementation
-    def generate_tree(dir_path, prefix="", depth=0, max_depth=2):
-        if depth >= max_depth:
-            return []
-        
-        lines = []
-        try:
-            # Sort directories first, then files
-            entries = sorted(os.listdir(dir_path), key=lambda s: (not os.path.isdir(os.path.join(dir_path, s)), s))
-            entries = [e for e in entries if not e.startswith('.')] # Skip hidden files by default
-            
-            for i, entry in enumerate(entries):
-                is_last = (i == len(entries) - 1)
-                connector = "└── " if is_last else "├── "
-                
-                full_path = os.path.join(dir_path, entry)
-                if os.path.isdir(full_path):
-                    if entry in ["node_modules", "venv", "__pycache__", "dist", "build"]:
-                         lines.append(f"{prefix}{connector}{entry}/ ...")
-                    else:
-                        lines.append(f"{prefix}{connector}{entry}/")
-                        extension = "    " if is_last else "│   "
-                        lines.extend(generate_tree(full_path, prefix + extension, depth + 1, max_depth))
-                else:
-                    lines.append(f"{prefix}{connector}{entry}")
-        except PermissionError:
-            pass
-        return lines
-
-    tree_lines = generate_tree(".")
-    structure = "\n".join(tree_lines)
+    structure = _get_tree(".")
         
     # 3. Get recent changes (git status)
     try:
-        # Use git to get recent changes if available
-        changes_output = subprocess.check_output(["git", "status", "--short"], stderr=subprocess.DEVNULL, text=True)
+        # Use git to get recent changes if available; run both queries concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            status_future = executor.submit(_git, "status", "--short")
+            log_future = executor.submit(_git, "log", "-1", "--oneline")
+            changes_output = status_future.result()
+            last_commit = log_future.result().strip()
+
         if changes_output:
             changes = "```\n" + changes_output + "```"
         else:
             changes = "Working tree clean."
-        
-        # Get last commit
-        last_commit = subprocess.check_output(["git", "log", "-1", "--oneline"], stderr=subprocess.DEVNULL, text=True).strip()
         changes += f"\n\nLast commit: {last_commit}"
     except (subprocess.CalledProcessError, FileNotFoundError):
         changes = "Not a git repository."
 
     # 4. Generate State Report
+    # Rendered once per process, so plain str.format is cheapest here
     report = STATE_TEMPLATE.format(
         timestamp=datetime.now().isoformat(),
         goals=goals_content.strip(),
@@ -160,8 +252,50 @@ def cmd_state(args):
         print(report)
         print("="*55)
 
+def _count_newlines(f, dst=None):
+    """
+    Count newlines in the open binary file `f` from its start, reading it in
+    COPY_BUFSIZE chunks. If `dst` is given, each chunk is also written to it.
+    """
+    f.seek(0)
+    count = 0
+    for chunk in iter(lambda: f.read(COPY_BUFSIZE), b""):
+        count += chunk.count(b"\n")
+        if dst is not None:
+            dst.write(chunk)
+    return count
+
+def _head_lines(files, n):
+    """
+    Return up to the first n lines across the given open binary files, in
+    order. Each read is capped at COPY_BUFSIZE so output without newlines is
+    never pulled in whole; a line that hits the cap ends its stream's preview.
+    Lines longer than PREVIEW_WIDTH chars are cut short.
+    """
+    head = []
+    for f in files:
+        f.seek(0)
+        while len(head) < n:
+            line = f.readline(COPY_BUFSIZE)
+            if not line:
+                break
+            capped = len(line) == COPY_BUFSIZE and not line.endswith(b"\n")
+            text = line.decode("utf-8", "replace").rstrip("\r\n")
+            if capped or len(text) > PREVIEW_WIDTH:
+                text = text[:PREVIEW_WIDTH] + " ..."
+            head.append(text)
+            if capped:
+                break
+        if len(head) >= n:
+            break
+    return head
+
 def cmd_wrap(args):
     """Run a command and capture its output to memory if it's too long."""
+    import subprocess
+    import tempfile
+    import time
+
     cmd = args.command
     if not cmd:
         print("Error: No command provided.")
@@ -169,47 +303,64 @@ def cmd_wrap(args):
 
     print(f"▶️  Running: {' '.join(cmd)}")
 
-    start_time = time.time()
-    result = subprocess.run(cmd, shell=False, capture_output=True, text=True)
-    duration = time.time() - start_time
-
-    stdout = result.stdout
-    stderr = result.stderr
-    combined = stdout + stderr
-
-    # Threshold for "long output" (e.g., 1000 chars or 20 lines)
-    is_long = len(combined) > 1000 or combined.count('\n') > 20
-
-    if is_long or args.force:
-        # Ensure observations directory exists
-        OBSERVATIONS_DIR.mkdir(parents=True, exist_ok=True)
-
-        # Save to file
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        cmd_slug = "_".join(cmd)[:30].replace("/", "_") # simplistic slug
-        filename = f"{timestamp}_{cmd_slug}.log"
-        file_path = OBSERVATIONS_DIR / filename
-
-        # Construct content
-        cmd_str = ' '.join(args.command)
-        content = f"Command: {cmd_str}\n\n=== STDOUT ===\n{stdout}\n\n=== STDERR ===\n{stderr}"
-        file_path.write_text(content)
-
-        # Generate summary for stdout
-        line_count = combined.count('\n')
-        summary = f"""
-✅ Command finished in {duration:.2f}s (Exit Code: {result.returncode})
+    # Stream the child's output into anonymous scratch files instead of
+    # buffering it in memory; they are unique per run and vanish on close.
+    # Keep them next to the log when memory is initialised, so a tmpfs /tmp
+    # doesn't hold the capture in RAM; otherwise fall back to $TMPDIR rather
+    # than creating .agent_memory for output that may never be saved.
+    scratch_dir = MEMORY_DIR if MEMORY_DIR.is_dir() else None
+    with tempfile.TemporaryFile(dir=scratch_dir) as out, tempfile.TemporaryFile(dir=scratch_dir) as err:
+        start_time = time.time()
+        proc = subprocess.Popen(cmd, shell=False, stdout=out, stderr=err)
+        returncode = proc.wait()
+        duration = time.time() - start_time
+
+        size = os.fstat(out.fileno()).st_size + os.fstat(err.fileno()).st_size
+
+        # Threshold for "long output" (e.g., 1000 bytes or 20 lines). Past 1000
+        # bytes the line count is only needed for the summary, so it is taken
+        # while copying into the log rather than in a separate pass.
+        line_count = None
+        if size <= 1000:
+            line_count = _count_newlines(out) + _count_newlines(err)
+        is_long = size > 1000 or line_count > 20
+
+        if is_long or args.force:
+            # Ensure observations directory exists
+            OBSERVATIONS_DIR.mkdir(parents=True, exist_ok=True)
+
+            # Save to file
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            cmd_slug = "_".join(cmd)[:30].replace("/", "_") # simplistic slug
+            filename = f"{timestamp}_{cmd_slug}.log"
+            file_path = OBSERVATIONS_DIR / filename
+
+            # Assemble the log from the captured streams
+            cmd_str = ' '.join(args.command)
+            with open(file_path, "wb") as log:
+                log.write(f"Command: {cmd_str}\n\n=== STDOUT ===\n".encode("utf-8"))
+                line_count = _count_newlines(out, log)
+                log.write(b"\n\n=== STDERR ===\n")
+                line_count += _count_newlines(err, log)
+
+            # Generate summary for stdout
+            summary = f"""
+✅ Command finished in {duration:.2f}s (Exit Code: {returncode})
 📦 Output saved to: {file_path}
-📊 Size: {len(combined)} chars, {line_count} lines
+📊 Size: {size} bytes, {line_count} lines
 
 Preview (Head 10 lines):
-{chr(10).join(combined.splitlines()[:10])}
+{chr(10).join(_head_lines((out, err), 10))}
 ...
 """
-        print(summary)
-    else:
-        # Just print it if it's short
-        print(combined)
+            print(summary)
+        else:
+            # Just print it if it's short
+            out.seek(0)
+            err.seek(0)
+            stdout = out.read().decode("utf-8", "replace")
+            stderr = err.read().decode("utf-8", "replace")
+            print(stdout, stderr, sep="")
 
 def cmd_read(args):
     """Read a previously saved observation file."""
@@ -221,15 +372,25 @@ def cmd_read(args):
     if not file_path.exists():
         # Try to find by partial match
         try:
-            matches = list(OBSERVATIONS_DIR.glob(f"*{filename}*"))
-            if matches:
-                file_path = matches[0]
+            # A missing observations directory just means nothing matches
+            try:
+                with os.scandir(OBSERVATIONS_DIR) as it:
+                    match = next((e for e in it if filename in e.name), None)
+            except FileNotFoundError:
+                match = None
+            if match is not None:
+                file_path = Path(match.path)
                 print(f"📄 Found: {file_path.name}")
             else:
                 print(f"❌ Error: No observation file matching '{filename}' found.")
                 print(f"Available files in {OBSERVATIONS_DIR}:")
-                for f in OBSERVATIONS_DIR.glob("*.log"):
-                    print(f"  - {f.name}")
+                try:
+                    with os.scandir(OBSERVATIONS_DIR) as it:
+                        log_names = [e.name for e in it if e.name.endswith(".log")]
+                except FileNotFoundError:
+                    log_names = []
+                for name in log_names:
+                    print(f"  - {name}")
                 return
         except Exception as e:
             print(f"❌ Error: {e}")
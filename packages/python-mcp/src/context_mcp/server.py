@@ -2,6 +2,7 @@ from mcp.server.fastmcp import FastMCP
 import os
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 import json
@@ -16,6 +17,19 @@ MEMORY_DIR = Path(".agent_memory")
 OBSERVATIONS_DIR = MEMORY_DIR / "observations"
 CACHE_DIR = MEMORY_DIR / "context_cache"
 
+# Directories listed in the tree but never descended into
+SKIP_DIRS = frozenset({"node_modules", "venv", "__pycache__", "dist", "build", ".git"})
+
+# Rendered trees keyed by (abs dir_path, max_depth) -> (((path, ctime_ns), ...), tree)
+_TREE_CACHE = {}
+
+# A directory whose ctime is this close to the scan start may still change within
+# the same timestamp tick (FAT rounds to 2s), so a render including it is not cached
+_RACY_WINDOW_NS = 2_000_000_000
+
+# goals.md contents keyed by abs path -> ((mtime_ns, size), content)
+_GOALS_CACHE = {}
+
 CODING_STANDARDS_TEMPLATE = """# Coding Standards
 
 ## General Principles
@@ -57,8 +71,42 @@ Updated: {timestamp}
 {structure}
 """
 
+# Static templates pre-encoded for the init path
+CODING_STANDARDS_BYTES = CODING_STANDARDS_TEMPLATE.encode("utf-8")
+GOALS_BYTES = GOALS_TEMPLATE.encode("utf-8")
+GITIGNORE_BYTES = b"*\n!.gitignore\n!goals.md\n"
+
 # --- Helpers ---
 
+def _create_file(path: Path, content: bytes) -> bool:
+    """
+    Write the bytes `content` to `path` only if it does not exist yet. O_EXCL
+    fuses the existence check and the create into a single open().
+    Returns True if the file was created.
+    """
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    return True
+
+def _make_context_dirs() -> None:
+    """
+    Create the leaf context directories. In an existing workspace each leaf
+    costs a single mkdir failing with EEXIST; a parent is only created when
+    its leaf's mkdir reports it missing.
+    """
+    for d in (SKILLS_DIR, OBSERVATIONS_DIR, CACHE_DIR):
+        try:
+            os.mkdir(d)
+        except FileExistsError:
+            pass
+        except FileNotFoundError:
+            d.parent.mkdir(exist_ok=True)
+            d.mkdir(exist_ok=True)
+
 def _ensure_context_structure() -> bool:
     """
     Auto-initialize context structure if it doesn't exist (lazy loading).
@@ -71,60 +119,145 @@ def _ensure_context_structure() -> bool:
         needs_init = True
 
         # Create directories
-        SKILLS_DIR.mkdir(parents=True, exist_ok=True)
-        OBSERVATIONS_DIR.mkdir(parents=True, exist_ok=True)
-        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        _make_context_dirs()
 
         # Create templates
         skills_file = SKILLS_DIR / "coding-standards.md"
-        if not skills_file.exists():
-            skills_file.write_text(CODING_STANDARDS_TEMPLATE)
+        _create_file(skills_file, CODING_STANDARDS_BYTES)
 
         goals_file = MEMORY_DIR / "goals.md"
-        if not goals_file.exists():
-            goals_file.write_text(GOALS_TEMPLATE)
+        _create_file(goals_file, GOALS_BYTES)
 
         gitignore = MEMORY_DIR / ".gitignore"
-        if not gitignore.exists():
-            gitignore.write_text("*\n!.gitignore\n!goals.md\n")
+        _create_file(gitignore, GITIGNORE_BYTES)
 
     return needs_init
 
-def _get_tree(dir_path: str = ".", max_depth: int = 2) -> str:
-    """Generate a simplified directory tree string."""
-    def generate_lines(path, prefix="", depth=0):
-        if depth >= max_depth:
-            return []
-        
-        lines = []
+def _scan(path, scanned: list | None = None) -> list:
+    """
+    List a directory once via scandir as (is_dir, name, path, is_link) tuples,
+    skipping hidden entries. Directories sort first, then files; symlinks to
+    directories count as directories.
+    If `scanned` is given, (path, ctime_ns) is appended to it first.
+    """
+    # Deliberately not os.fwalk: it adds an lstat+fstat per subdirectory. For a
+    # shallow tree, one scandir per directory is cheaper.
+    if scanned is not None:
+        scanned.append((path, os.stat(path).st_ctime_ns))
+    entries = []
+    with os.scandir(path) as it:
+        for e in it:
+            if e.name.startswith('.'):
+                continue
+            try:
+                is_dir = e.is_dir()
+            except OSError:
+                is_dir = False
+            entries.append((is_dir, e.name, e.path, e.is_symlink()))
+    entries.sort(key=lambda t: (not t[0], t[1]))
+    return entries
+
+def _get_tree(dir_path: str = ".", max_depth: int = 2, scanned: list | None = None) -> str:
+    """
+    Generate a simplified directory tree string.
+    If `scanned` is given, (path, ctime_ns) is recorded for every directory read.
+    """
+    if max_depth <= 0:
+        return ""
+    scan = _scan
+    skip_dirs = SKIP_DIRS
+    try:
+        entries = scan(dir_path, scanned)
+    except PermissionError:
+        return ""
+
+    parts = []
+    extend = parts.extend
+    # One frame per directory being listed: (prefix, depth, last index, entries).
+    # Descending pauses the parent's iterator, so line pieces are emitted in
+    # display order straight into `parts` without building per-line strings.
+    stack = [("", 0, len(entries) - 1, enumerate(entries))]
+    while stack:
+        prefix, depth, last, it = stack[-1]
+        for i, (is_dir, name, full_path, is_link) in it:
+            connector = "└── " if i == last else "├── "
+            if not is_dir:
+                extend((prefix, connector, name, "\n"))
+            elif name in skip_dirs:
+                extend((prefix, connector, name, "/ ...\n"))
+            else:
+                extend((prefix, connector, name, "/\n"))
+                # Only list subdirectories within max_depth; symlinked ones are
+                # shown but never descended into, which rules out link cycles
+                if depth + 1 < max_depth and not is_link:
+                    try:
+                        children = scan(full_path, scanned)
+                    except PermissionError:
+                        continue
+                    extension = "    " if i == last else "│   "
+                    stack.append((prefix + extension, depth + 1, len(children) - 1, enumerate(children)))
+                    break
+        else:
+            stack.pop()
+
+    # Drop the trailing newline of the last line
+    return "".join(parts)[:-1]
+
+def _get_cached_tree(dir_path: str = ".", max_depth: int = 2) -> str:
+    """
+    Return the directory tree, reusing the last render while none of the
+    scanned directories has changed. A directory's ctime moves whenever an
+    entry in it is added, removed or renamed, and also when its permissions
+    change (which decides whether it can be listed), so one stat per
+    directory replaces a full scandir and sort.
+    """
+    key = (os.path.abspath(dir_path), max_depth)
+    cached = _TREE_CACHE.get(key)
+    if cached is not None:
+        fingerprint, tree = cached
         try:
-            entries = sorted(os.listdir(path), key=lambda s: (not os.path.isdir(os.path.join(path, s)), s))
-            entries = [e for e in entries if not e.startswith('.')]
-            
-            for i, entry in enumerate(entries):
-                is_last = (i == len(entries) - 1)
-                connector = "└── " if is_last else "├── "
-                
-                full_path = os.path.join(path, entry)
-                if os.path.isdir(full_path):
-                    if entry in ["node_modules", "venv", "__pycache__", "dist", "build", ".git"]:
-                         lines.append(f"{prefix}{connector}{entry}/ ...")
-                    else:
-                        lines.append(f"{prefix}{connector}{entry}/")
-                        extension = "    " if is_last else "│   "
-                        lines.extend(generate_lines(full_path, prefix + extension, depth + 1))
-                else:
-                    lines.append(f"{prefix}{connector}{entry}")
-        except PermissionError:
+            if all(os.stat(path).st_ctime_ns == ctime for path, ctime in fingerprint):
+                return tree
+        except OSError:
             pass
-        return lines
 
-    return "\n".join(generate_lines(dir_path))
+    scan_start = time.time_ns()
+    scanned = []
+    tree = _get_tree(dir_path, max_depth, scanned=scanned)
+
+    # Like git's racy-index check: an entry added in the same tick right after
+    # the scan leaves ctime unchanged, so only cache when every ctime is older
+    if all(ctime < scan_start - _RACY_WINDOW_NS for _, ctime in scanned):
+        _TREE_CACHE[key] = (tuple(scanned), tree)
+    else:
+        _TREE_CACHE.pop(key, None)
+    return tree
+
+def _read_goals(goals_file: Path) -> str:
+    """Read goals.md, reusing the last read while its mtime and size are unchanged."""
+    try:
+        st = os.stat(goals_file)
+    except FileNotFoundError:
+        return "No goals defined."
+
+    key = os.path.abspath(goals_file)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _GOALS_CACHE.get(key)
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, goals_file.read_text())
+        _GOALS_CACHE[key] = cached
+    return cached[1]
+
+def _git(*args: str) -> str:
+    """Run a read-only git command without taking optional index locks."""
+    env = dict(os.environ, GIT_OPTIONAL_LOCKS="0")
+    result = subprocess.run(["git", *args], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env, check=True)
+    return result.stdout.decode("utf-8", "replace")
 
 def _get_git_status() -> str:
     """Get concise git status."""
     try:
-        changes = subprocess.check_output(["git", "status", "--short"], stderr=subprocess.DEVNULL, text=True).strip()
+        changes = _git("status", "--short").strip()
         if changes:
             return f"```\n{changes}\n```"
         return "Working tree clean."
@@ -142,24 +275,21 @@ def initialize_context_system() -> str:
     results = []
 
     # Create directories
+    _make_context_dirs()
     for d in [SKILLS_DIR, OBSERVATIONS_DIR, CACHE_DIR]:
-        d.mkdir(parents=True, exist_ok=True)
         results.append(f"✅ Created directory: {d}")
 
     # Create templates
     skills_file = SKILLS_DIR / "coding-standards.md"
-    if not skills_file.exists():
-        skills_file.write_text(CODING_STANDARDS_TEMPLATE)
+    if _create_file(skills_file, CODING_STANDARDS_BYTES):
         results.append(f"✅ Created skill: {skills_file}")
 
     goals_file = MEMORY_DIR / "goals.md"
-    if not goals_file.exists():
-        goals_file.write_text(GOALS_TEMPLATE)
+    if _create_file(goals_file, GOALS_BYTES):
         results.append(f"✅ Created memory: {goals_file}")
 
     gitignore = MEMORY_DIR / ".gitignore"
-    if not gitignore.exists():
-        gitignore.write_text("*\n!.gitignore\n!goals.md\n")
+    if _create_file(gitignore, GITIGNORE_BYTES):
         results.append(f"✅ Created .gitignore for memory")
 
     return "\n".join(results)
@@ -173,13 +303,18 @@ def get_workspace_state() -> str:
     # Auto-initialize if needed
     _ensure_context_structure()
 
-    # 1. Read goals
-    goals_file = MEMORY_DIR / "goals.md"
-    goals_content = goals_file.read_text() if goals_file.exists() else "No goals defined."
-    
-    # 2. Get structure and changes
-    structure = _get_tree()
-    changes = _get_git_status()
+    # git status mostly waits on the subprocess, so run it alongside the
+    # goals read and tree walk rather than after them
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        git_future = executor.submit(_get_git_status)
+
+        # 1. Read goals
+        goals_file = MEMORY_DIR / "goals.md"
+        goals_content = _read_goals(goals_file)
+
+        # 2. Get structure and changes
+        structure = _get_cached_tree()
+        changes = git_future.result()
     
     # 3. Generate Report
     report = STATE_TEMPLATE.format(
@@ -208,12 +343,12 @@ def save_observation(content: str, summary: str, filename_hint: str = "observati
     # Auto-initialize if needed
     _ensure_context_structure()
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
     safe_hint = "".join(c for c in filename_hint if c.isalnum() or c in "_-")[:30]
     filename = f"{timestamp}_{safe_hint}.txt"
     file_path = OBSERVATIONS_DIR / filename
     
-    file_path.write_text(content)
+    file_path.write_bytes(content.encode("utf-8"))
     
     return f"""
 ✅ Content saved to external memory.
@@ -247,7 +382,7 @@ def read_observation(file_path: str) -> str:
     except ValueError:
         return f"Error: Access denied - file must be in observations directory"
 
-    return path.read_text()
+    return path.read_text(encoding="utf-8", errors="replace")
 
 def main():
     """Entry point for the MCP server."""